@@ -3,6 +3,7 @@ import logging
 import threading
 from pymodbus.client import ModbusSerialClient
 from pymodbus.exceptions import ModbusIOException
+from serial_arbiter import SerialBusArbiter, PRIORITY_WRITE
 
 # Enable logging to see Modbus frames and errors
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -17,6 +18,9 @@ client = ModbusSerialClient(
     timeout=1  # 1000ms timeout
 )
 
+# Both writer threads share the COM port through the arbiter so frames never interleave
+bus = SerialBusArbiter(client, name='COM5')
+
 # Initialize variables
 value = 0  # Start from 0 for writing holding registers
 holding_write_errors = 0  # Errors for holding register writes
@@ -33,7 +37,7 @@ def write_holding_register():
             if value > 9999:
                 value = 0  # Reset to 0 after 9999
             try:
-                response = client.write_register(87, value, slave=1)
+                response = bus.call("write_register", 87, value, slave=1, priority=PRIORITY_WRITE)
                 logging.info(f"Writing {value} to register 87 (40087)")
                 if response.isError():
                     logging.error(f"Error writing {value} to register 87 (40087)")
@@ -55,7 +59,7 @@ def write_coils():
         while time.time() - start_time < test_duration:
             try:
                 # Turn all coils ON for 1 second
-                response = client.write_coils(coils[0], [True] * len(coils), slave=1)
+                response = bus.call("write_coils", coils[0], [True] * len(coils), slave=1, priority=PRIORITY_WRITE)
                 logging.info("Turning all coils ON [24-28]")
                 if response.isError():
                     logging.error("Error writing coils ON [24-28]")
@@ -63,7 +67,7 @@ def write_coils():
                 time.sleep(1)  # ON duration
                 
                 # Turn all coils OFF for 1 second
-                response = client.write_coils(coils[0], [False] * len(coils), slave=1)
+                response = bus.call("write_coils", coils[0], [False] * len(coils), slave=1, priority=PRIORITY_WRITE)
                 logging.info("Turning all coils OFF [24-28]")
                 if response.isError():
                     logging.error("Error writing coils OFF [24-28]")
@@ -79,6 +83,7 @@ def write_coils():
 # Start both threads simultaneously
 if client.connect():
     print("Connected to Modbus RTU slave.")
+    bus.start()
     thread1 = threading.Thread(target=write_holding_register)
     thread2 = threading.Thread(target=write_coils)
     
@@ -88,6 +93,7 @@ if client.connect():
     thread1.join()
     thread2.join()
     
+    bus.stop()
     client.close()
     
     print("\n===== TEST COMPLETED =====")
@@ -95,6 +101,10 @@ if client.connect():
     print(f"Coil write errors: {coil_write_errors}")
     print(f"Final poll time: {poll_delay}s")
     print(f"Response timeout: {client.comm_params.timeout_connect}s")
+    stats = bus.stats()
+    print(f"Bus queue depth (max): {stats['max_queue_depth']}")
+    for priority, s in stats["priorities"].items():
+        print(f"Bus wait (priority {priority}): avg {s['avg_wait'] * 1000:.1f} ms, max {s['max_wait'] * 1000:.1f} ms")
     print("==========================")
 else:
     print("Failed to connect to Modbus RTU slave.")
\ No newline at end of file
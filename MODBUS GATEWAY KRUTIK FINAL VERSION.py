@@ -1,12 +1,15 @@
 import sys
-import time
-import threading
+import asyncio
+import functools
 import logging
-from pymodbus.server import StartTcpServer
+from pymodbus.server import StartAsyncTcpServer
 from pymodbus.datastore import ModbusServerContext, ModbusSlaveContext
 from pymodbus.datastore import ModbusSequentialDataBlock
-from pymodbus.client import ModbusSerialClient
+from pymodbus.client import AsyncModbusSerialClient
 from pymodbus.exceptions import ModbusException, ModbusIOException
+from serial_arbiter import AsyncSerialBusArbiter, PRIORITY_WRITE, PRIORITY_POLL
+from read_planner import plan_reads, describe_plan, READ_METHODS, BLOCK_NAMES
+from poll_groups import PollJob, PollScheduler
 
 
 # Configuration
@@ -23,52 +26,88 @@ TCP_SERVER_PORT = 502
 POLLING_INTERVAL = 0.5
 RTU_TIMEOUT = 2.0
 
+# Serial lines: each port gets its own bus arbiter and polling task, so lines
+# are polled in parallel instead of sharing one COM port's bandwidth.
+SERIAL_LINES = {
+    SERIAL_PORT: {"baudrate": BAUD_RATE, "parity": PARITY, "stopbits": STOP_BITS},
+    # "COM6": {"baudrate": 9600, "parity": 'E', "stopbits": 1},
+}
+
+# Routing table: TCP unit ID -> (serial port, RTU slave ID)
+ROUTES = {
+    1: (SERIAL_PORT, RTU_SLAVE_ID),
+    # 2: (SERIAL_PORT, 2),
+    # 11: ("COM6", 1),
+}
+
+# Register map: the addresses the gateway actually needs, per read function code
+# (1 coils, 2 discrete inputs, 3 holding registers, 4 input registers). The read
+# planner turns these into the fewest RTU requests that fit the protocol limits.
+READ_MAP = {
+    3: range(HOLDING_REGISTERS_COUNT),
+    4: range(INPUT_REGISTERS_COUNT),
+    1: range(COIL_COUNT),
+}
+# Largest hole of unused addresses to read through rather than start a new frame;
+# None uses the planner's defaults (10 registers / 160 bits)
+READ_GAP_MERGE = None
+
+# Poll groups: each group scans its own part of the register map at its own
+# period. Lower priority numbers are served first on the bus (forwarded writes
+# always go first); the deadline (default: the period) is how long after its
+# release a cycle may take before it counts as an overrun.
+POLL_GROUPS = {
+    "default": {"period": POLLING_INTERVAL, "priority": PRIORITY_POLL, "read_map": READ_MAP},
+    # "process": {"period": 0.1, "priority": 5, "deadline": 0.1, "read_map": {4: range(5)}},
+    # "config": {"period": 60.0, "priority": 20, "read_map": {3: range(50, 94)}},
+}
+# Per-slave overrides keyed by (serial port, RTU slave ID)
+SLAVE_POLL_GROUPS = {
+    # ("COM6", 1): {"fast": {"period": 0.2, "read_map": {3: [0, 1, 2, 10, 11, 200], 2: range(16)}}},
+}
+
 
 logging.basicConfig(
     format="%(asctime)s %(levelname)s %(message)s",
     level=logging.DEBUG
 )
 
-# --- Initialize RTU Client ---
-rtu_client = ModbusSerialClient(
-    port=SERIAL_PORT,
-    baudrate=BAUD_RATE,
-    parity=PARITY,
-    stopbits=STOP_BITS,
-    bytesize=8,
-    timeout=RTU_TIMEOUT,
-)
-
-if not rtu_client.connect():
-    logging.error(f"Error: Could not connect to Modbus RTU Slave on {SERIAL_PORT}.")
-    sys.exit(1)
-
-logging.info(f"Connected to Modbus RTU Slave on {SERIAL_PORT} (ID {RTU_SLAVE_ID})")
-
 # --- Custom Modbus Slave Context ---
+# The TCP server awaits async_setValues for every write request, so forwarding a
+# write to the RTU device only suspends that one request; other TCP connections
+# keep being served from the datastore on the same event loop.
 class GatewaySlaveContext(ModbusSlaveContext):
-    def __init__(self, di=None, co=None, hr=None, ir=None, rtu_client=None):
+    def __init__(self, di=None, co=None, hr=None, ir=None, bus=None, slave_id=RTU_SLAVE_ID):
         super().__init__(di=di, co=co, hr=hr, ir=ir)
-        self.rtu_client = rtu_client
+        self.bus = bus
+        self.slave_id = slave_id
+        self.read_plan = []
 
-    def setValues(self, fx, address, values):
-        super().setValues(fx, address, values)
+    async def async_setValues(self, fx, address, values):
+        self.setValues(fx, address, values)
+        if self.bus:
+            await self.forward_write(fx, address, values)
 
+    async def forward_write(self, fx, address, values):
         # Handle writes to holding registers (function code 3 is read holding, 6 is single write, 16 is multiple write)
-        if (fx == 6 or fx == 16) and self.rtu_client:
+        if fx == 6 or fx == 16:
             try:
-                logging.info(f"Forwarding write to RTU device: address={address}, values={values}, function code = {fx}")
+                logging.info(f"Forwarding write to RTU device {self.bus.name}/{self.slave_id}: address={address}, values={values}, function code = {fx}")
                 if fx == 6: #Single Register
-                    result = self.rtu_client.write_register(
+                    result = await self.bus.call(
+                        "write_register",
+                        priority=PRIORITY_WRITE,
                         address=address,
                         value=values[0],  # write_register takes a single value
-                        slave=RTU_SLAVE_ID
+                        slave=self.slave_id
                     )
                 if fx == 16: #Multiple Register
-                    result = self.rtu_client.write_registers(
+                    result = await self.bus.call(
+                        "write_registers",
+                        priority=PRIORITY_WRITE,
                         address=address,
                         values=values,
-                        slave=RTU_SLAVE_ID
+                        slave=self.slave_id
                     )
                 # Check for Modbus exception responses
                 if result.isError():
@@ -82,13 +121,15 @@ class GatewaySlaveContext(ModbusSlaveContext):
                 logging.error(f"General error writing to RTU device: {e}")
 
         # Handle writes to coils (function code 5 is single coil write)
-        if fx == 5 and self.rtu_client:
+        if fx == 5:
             try:
-                logging.info(f"Forwarding single coil write to RTU device: address={address}, value={values[0]}")
-                result = self.rtu_client.write_coil(
+                logging.info(f"Forwarding single coil write to RTU device {self.bus.name}/{self.slave_id}: address={address}, value={values[0]}")
+                result = await self.bus.call(
+                    "write_coil",
+                    priority=PRIORITY_WRITE,
                     address=address,
                     value=values[0],  # write_coil takes a single boolean value
-                    slave=RTU_SLAVE_ID
+                    slave=self.slave_id
                 )
                 if result.isError():
                     logging.error(f"Modbus error response writing coil to RTU device: {result}")
@@ -100,13 +141,15 @@ class GatewaySlaveContext(ModbusSlaveContext):
                 logging.error(f"General error writing coil to RTU device: {e}")
 
         #Handle multiple coil writes (function code 15)
-        if fx == 15 and self.rtu_client:
+        if fx == 15:
             try:
-                logging.info(f"Forwarding multiple coil write to RTU device: address={address}, values={values}")
-                result = self.rtu_client.write_coils(  # Note: write_coils, plural
+                logging.info(f"Forwarding multiple coil write to RTU device {self.bus.name}/{self.slave_id}: address={address}, values={values}")
+                result = await self.bus.call(
+                    "write_coils",  # Note: write_coils, plural
+                    priority=PRIORITY_WRITE,
                     address = address,
                     values = values,
-                    slave = RTU_SLAVE_ID
+                    slave = self.slave_id
                 )
                 if result.isError():
                     logging.error(f"Modbus error response from RTU device when writing coils: {result}")
@@ -117,98 +160,152 @@ class GatewaySlaveContext(ModbusSlaveContext):
             except Exception as e:
                 logging.error(f"General error when writing coils to RTU Device: {e}")
 
-# --- Create Modbus TCP Slave Context ---
-store = GatewaySlaveContext(
-    di=ModbusSequentialDataBlock(0, [0] * 100),
-    co=ModbusSequentialDataBlock(0, [0] * COIL_COUNT),  # Initialize coils
-    hr=ModbusSequentialDataBlock(0, [0] * 100),
-    ir=ModbusSequentialDataBlock(0, [0] * 100),
-    rtu_client=rtu_client
-)
-context = ModbusServerContext(slaves={1: store}, single=False)
-
-# --- Modbus Gateway (Polling Loop) ---
-def modbus_gateway():
-    while True:
-        try:
-            # Read holding registers from RTU slave
-            logging.debug("Sending Modbus RTU Request for Holding Registers...")
-            rr_holding = rtu_client.read_holding_registers(
-                address=0,
-                count=HOLDING_REGISTERS_COUNT,
-                slave=RTU_SLAVE_ID
-            )
+# --- Modbus Gateway (Polling Task) ---
+# One task per serial line; its scheduler runs the poll groups of every RTU slave
+# routed to that line at their own periods.
+async def modbus_gateway(bus, scheduler):
+    logging.info(f"Poll schedule for {bus.name}: {len(scheduler.jobs)} groups, "
+                 f"~{scheduler.utilization() * 100:.0f}% estimated bus utilization")
+    if scheduler.utilization() > 1:
+        logging.warning(f"Poll groups on {bus.name} need more bus time than the line has; expect overruns")
+    await scheduler.run()
 
-            # Read input registers from RTU slave
-            logging.debug("Sending Modbus RTU Request for Input Registers...")
-            rr_input = rtu_client.read_input_registers(
-                address=0,
-                count=INPUT_REGISTERS_COUNT,
-                slave=RTU_SLAVE_ID
+async def poll_group(bus, job):
+    slave_id, store = job.slave_id, job.store
+    try:
+        for request in job.read_plan:
+            name = BLOCK_NAMES[request.fc]
+            logging.debug(f"Sending Modbus RTU Request for {name} {request.address}-{request.address + request.count - 1} to {bus.name}/{slave_id}...")
+            rr = await bus.call(
+                READ_METHODS[request.fc],
+                priority=job.priority,
+                address=request.address,
+                count=request.count,
+                slave=slave_id
             )
 
-            # Read coils from RTU slave
-            logging.debug("Sending Modbus RTU Request for Coils...")
-            rr_coils = rtu_client.read_coils(
-                address=0,
-                count=COIL_COUNT,  # Read all the coils we have defined
-                slave=RTU_SLAVE_ID
-            )
+            # --- Error Handling and Updating ---
+            values_attr = 'bits' if request.fc in (1, 2) else 'registers'
+            if rr is None:
+                logging.error(f"No response received from RTU slave for {name} (None returned)")
+            elif rr.isError():
+                logging.error(f"Modbus error response from RTU slave for {name}: {rr}")
+            elif not hasattr(rr, values_attr):
+                logging.error(f"Invalid response format for {name}: {rr}")
+            else:
+                # Bit responses are padded to a whole byte; only keep the requested count
+                values = getattr(rr, values_attr)[:request.count]
+                store.setValues(request.fc, request.address, values)
+                logging.info(f"{name} Updated ({bus.name}/{slave_id} @ {request.address}): {values}")
 
+    except ModbusIOException as e:
+        logging.error(f"Modbus I/O error on {bus.name}/{slave_id}: {e}")
+    except ModbusException as e:
+        logging.error(f"Modbus exception during read from {bus.name}/{slave_id}: {e}")
+    except Exception as e:
+        logging.error(f"General error in gateway loop: {e}")
 
-            # --- Error Handling and Updating for Holding Registers ---
-            if rr_holding is None:
-                logging.error("No response received from RTU slave for Holding Registers (None returned)")
-            elif rr_holding.isError():
-                logging.error(f"Modbus error response from RTU slave for Holding Registers: {rr_holding}")
-            elif not hasattr(rr_holding, 'registers'):
-                logging.error(f"Invalid response format for Holding Registers: {rr_holding}")
-            else:
-                # Update the TCP server's data store for holding registers
-                store.setValues(3, 0, rr_holding.registers)
-                logging.info(f"Holding Registers Updated: {rr_holding.registers}")
-
-
-            # --- Error Handling and Updating for Input Registers ---
-            if rr_input is None:
-                logging.error("No response received from RTU slave for Input Registers (None returned)")
-            elif rr_input.isError():
-                logging.error(f"Modbus error response from RTU slave for Input Registers: {rr_input}")
-            elif not hasattr(rr_input, 'registers'):
-                logging.error(f"Invalid response format for Input Registers: {rr_input}")
-            else:
-                # Update the TCP server's data store for input registers
-                store.setValues(4, 0, rr_input.registers)
-                logging.info(f"Input Registers Updated: {rr_input.registers}")
-
-
-            # --- Error Handling and Updating for Coils ---
-            if rr_coils is None:
-                logging.error("No response received from RTU slave for Coils (None returned)")
-            elif rr_coils.isError():
-                logging.error(f"Modbus error response from RTU slave for Coils: {rr_coils}")
-            elif not hasattr(rr_coils, 'bits'):  # Corrected attribute name
-                logging.error(f"Invalid response format for Coils: {rr_coils}")
-            else:
-                # Update the TCP server's data store for coils
-                store.setValues(1, 0, rr_coils.bits)  # Function code 1 for Coils
-                logging.info(f"Coils Updated: {rr_coils.bits}")
+    logging.debug(f"Serial bus stats for {bus.name}: {bus.stats()}")
+
+# Union of several read maps, for sizing the datastore of a slave with many groups
+def merge_read_maps(read_maps):
+    merged = {}
+    for read_map in read_maps:
+        for fc, addresses in read_map.items():
+            merged.setdefault(fc, set()).update(addresses)
+    return merged
+
+# Datastore blocks must cover every planned read (+1: the context is not zero_mode)
+def block_size(read_plan, fc, minimum):
+    ends = [request.address + request.count + 1 for request in read_plan if request.fc == fc]
+    return max([minimum] + ends)
+
+# --- Gateway Entry Point ---
+# The TCP server, the RTU polling tasks and the serial bus tasks (which perform the
+# forwarded writes) all run on one event loop.
+async def main():
+    buses = {}
+    schedulers = {}
+    line_slaves = {}
+    slaves = {}
+    for port, settings in SERIAL_LINES.items():
+        # --- Initialize RTU Client ---
+        rtu_client = AsyncModbusSerialClient(
+            port=port,
+            baudrate=settings["baudrate"],
+            parity=settings["parity"],
+            stopbits=settings["stopbits"],
+            bytesize=8,
+            timeout=RTU_TIMEOUT,
+        )
+
+        if not await rtu_client.connect():
+            logging.error(f"Error: Could not connect to Modbus RTU line on {port}.")
+            sys.exit(1)
+
+        logging.info(f"Connected to Modbus RTU line on {port} ({settings['baudrate']} baud)")
+
+        # --- Serial Bus Arbiter ---
+        # Polling and forwarded writes share each serial line; every RTU transaction
+        # goes through the line's arbiter so forwarded writes preempt polling.
+        buses[port] = AsyncSerialBusArbiter(rtu_client, name=port).start()
+        schedulers[port] = PollScheduler(port, functools.partial(poll_group, buses[port]))
+        line_slaves[port] = {}
+
+    # --- Create Modbus TCP Slave Contexts ---
+    # Unit IDs routed to the same (port, RTU slave) share one datastore.
+    for unit_id, (port, slave_id) in ROUTES.items():
+        if port not in buses:
+            logging.error(f"Error: Unit ID {unit_id} is routed to unknown serial line {port}.")
+            sys.exit(1)
+        if slave_id not in line_slaves[port]:
+            groups = SLAVE_POLL_GROUPS.get((port, slave_id), POLL_GROUPS)
+            read_plan = plan_reads(merge_read_maps(group["read_map"] for group in groups.values()), READ_GAP_MERGE)
+            store = GatewaySlaveContext(
+                di=ModbusSequentialDataBlock(0, [0] * block_size(read_plan, 2, 100)),
+                co=ModbusSequentialDataBlock(0, [0] * block_size(read_plan, 1, COIL_COUNT)),  # Initialize coils
+                hr=ModbusSequentialDataBlock(0, [0] * block_size(read_plan, 3, 100)),
+                ir=ModbusSequentialDataBlock(0, [0] * block_size(read_plan, 4, 100)),
+                bus=buses[port],
+                slave_id=slave_id
+            )
+            store.read_plan = read_plan
+            line_slaves[port][slave_id] = store
 
+            settings = SERIAL_LINES[port]
+            for name, group in groups.items():
+                group_plan = plan_reads(group["read_map"], READ_GAP_MERGE)
+                summary = describe_plan(group_plan, settings["baudrate"], parity=settings["parity"], stopbits=settings["stopbits"])
+                logging.info(f"Poll group {name} for {port}/{slave_id}: every {group['period']} s, "
+                             f"{summary['frames']} frames, {summary['values']} values, "
+                             f"~{summary['bus_time'] * 1000:.1f} ms bus time per cycle at {settings['baudrate']} baud")
+                schedulers[port].add(PollJob(
+                    name, slave_id, store, group_plan,
+                    period=group["period"],
+                    priority=group.get("priority", PRIORITY_POLL),
+                    deadline=group.get("deadline"),
+                    bus_time=summary["bus_time"],
+                ))
+        slaves[unit_id] = line_slaves[port][slave_id]
+        logging.info(f"Routing TCP unit ID {unit_id} to {port} RTU slave {slave_id}")
+    context = ModbusServerContext(slaves=slaves, single=False)
 
-        except ModbusIOException as e:
-            logging.error(f"Modbus I/O error: {e}")
-        except ModbusException as e:
-            logging.error(f"Modbus exception during read: {e}")
-        except Exception as e:
-            logging.error(f"General error in gateway loop: {e}")
+    gateway_tasks = [
+        asyncio.create_task(modbus_gateway(buses[port], schedulers[port]), name=f"modbus-gateway-poll-{port}")
+        for port in buses if schedulers[port].jobs
+    ]
 
-        time.sleep(POLLING_INTERVAL)
+    # --- Start Modbus TCP Server ---
+    logging.info(f"Starting Modbus TCP Server on {TCP_SERVER_ADDRESS}:{TCP_SERVER_PORT}...")
+    try:
+        await StartAsyncTcpServer(context=context, address=(TCP_SERVER_ADDRESS, TCP_SERVER_PORT))
+    finally:
+        for task in gateway_tasks:
+            task.cancel()
+        for bus in buses.values():
+            await bus.stop()
+            bus.client.close()
 
-# --- Start Threads ---
-gateway_thread = threading.Thread(target=modbus_gateway, daemon=True)
-gateway_thread.start()
 
-# --- Start Modbus TCP Server ---
-logging.info(f"Starting Modbus TCP Server on {TCP_SERVER_ADDRESS}:{TCP_SERVER_PORT}...")
-StartTcpServer(context=context, address=(TCP_SERVER_ADDRESS, TCP_SERVER_PORT))
-# The StartTcpServer function blocks, so no need for an infinite loop here.
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+
+
+# --- Poll Job ---
+# One named poll group of one RTU slave: what to read (a read plan), how often
+# (period), how urgently (bus priority) and by when each cycle must be done
+# (deadline, relative to the cycle's release time).
+class PollJob:
+    def __init__(self, name, slave_id, store, read_plan, period, priority, deadline=None, bus_time=0.0):
+        if period <= 0:
+            raise ValueError(f"Poll group {name} needs a positive period, got {period}")
+        self.name = name
+        self.slave_id = slave_id
+        self.store = store
+        self.read_plan = read_plan
+        self.period = period
+        self.priority = priority
+        self.deadline = deadline if deadline is not None else period
+        self.bus_time = bus_time
+        self.next_release = 0.0
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+        self.last_lateness = 0.0
+
+    def stats(self):
+        return {
+            "period": self.period,
+            "deadline": self.deadline,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "last_duration": self.last_duration,
+            "max_duration": self.max_duration,
+            "last_lateness": self.last_lateness,
+        }
+
+
+# --- Poll Scheduler ---
+# Runs every poll job of one serial line. Due jobs are served highest priority
+# first, then earliest deadline first. A job that finishes after its deadline is
+# counted as an overrun; cycles whose deadline has already passed before they
+# could start are skipped rather than run back to back.
+class PollScheduler:
+    def __init__(self, name, poll):
+        self.name = name
+        self.poll = poll
+        self.jobs = []
+
+    def add(self, job):
+        self.jobs.append(job)
+
+    def utilization(self):
+        return sum(job.bus_time / job.period for job in self.jobs)
+
+    def spread(self, start=None):
+        # Stagger first releases by the estimated bus time of the jobs before
+        # them, so groups don't all hit the line at the same instant.
+        start = time.monotonic() if start is None else start
+        offset = 0.0
+        for job in sorted(self.jobs, key=lambda j: (j.priority, j.period)):
+            job.next_release = start + offset % job.period
+            offset += job.bus_time
+
+    def stats(self):
+        return {f"{job.slave_id}/{job.name}": job.stats() for job in self.jobs}
+
+    def _next_job(self, now):
+        due = [job for job in self.jobs if job.next_release <= now]
+        if not due:
+            return None
+        return min(due, key=lambda j: (j.priority, j.next_release + j.deadline))
+
+    async def run(self):
+        self.spread()
+        while True:
+            now = time.monotonic()
+            job = self._next_job(now)
+            if job is None:
+                wake = min(j.next_release for j in self.jobs)
+                await asyncio.sleep(max(0.0, wake - now))
+                continue
+
+            release = job.next_release
+            await self.poll(job)
+            finished = time.monotonic()
+
+            job.runs += 1
+            job.last_duration = finished - now
+            job.max_duration = max(job.max_duration, job.last_duration)
+            job.last_lateness = finished - (release + job.deadline)
+            if job.last_lateness > 0:
+                job.overruns += 1
+                logging.warning(f"Poll group {job.name} on {self.name}/{job.slave_id} overran its "
+                                f"{job.deadline * 1000:.0f} ms deadline by {job.last_lateness * 1000:.1f} ms")
+
+            job.next_release = release + job.period
+            if job.next_release + job.deadline <= finished:
+                missed = int((finished - job.next_release - job.deadline) // job.period) + 1
+                job.skipped += missed
+                job.next_release += missed * job.period
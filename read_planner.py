@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+
+# --- Protocol Limits ---
+# Largest count a single read may ask for, per function code (Modbus spec).
+MAX_READ_COUNT = {1: 2000, 2: 2000, 3: 125, 4: 125}
+
+READ_METHODS = {
+    1: "read_coils",
+    2: "read_discrete_inputs",
+    3: "read_holding_registers",
+    4: "read_input_registers",
+}
+
+BLOCK_NAMES = {1: "Coils", 2: "Discrete Inputs", 3: "Holding Registers", 4: "Input Registers"}
+
+# Largest run of unused addresses that is still cheaper to read through than to
+# start a new frame. A new read costs ~20 characters on the wire (8 byte request,
+# 5 byte response header and the two 3.5 character silent intervals), which is
+# 10 registers or 160 bits of payload.
+DEFAULT_MAX_GAP = {1: 160, 2: 160, 3: 10, 4: 10}
+
+# Time the slave needs between receiving a request and starting its response.
+DEFAULT_TURNAROUND = 0.005
+
+ReadRequest = namedtuple("ReadRequest", ["fc", "address", "count"])
+
+
+# --- Read Planner ---
+# `addresses` maps a read function code (1-4) to the addresses we actually need.
+# Sorted addresses are merged into one request while the hole between them is at
+# most `max_gap` and the request stays within the protocol limit for that code.
+def plan_reads(addresses, max_gap=None):
+    plan = []
+    for fc in sorted(addresses):
+        if fc not in MAX_READ_COUNT:
+            raise ValueError(f"Function code {fc} is not a read function code")
+        gap = _max_gap_for(fc, max_gap)
+        limit = MAX_READ_COUNT[fc]
+        start = last = None
+        for address in sorted(set(addresses[fc])):
+            if address < 0 or address > 0xFFFF:
+                raise ValueError(f"Address {address} is outside the Modbus address space")
+            if start is not None and address - last - 1 <= gap and address - start < limit:
+                last = address
+                continue
+            if start is not None:
+                plan.append(ReadRequest(fc, start, last - start + 1))
+            start = last = address
+        if start is not None:
+            plan.append(ReadRequest(fc, start, last - start + 1))
+    return plan
+
+
+def _max_gap_for(fc, max_gap):
+    if max_gap is None:
+        return DEFAULT_MAX_GAP[fc]
+    if isinstance(max_gap, dict):
+        return max_gap.get(fc, DEFAULT_MAX_GAP[fc])
+    return max_gap
+
+
+# --- Bus Time Estimation ---
+def char_time(baudrate, bytesize=8, parity='N', stopbits=1):
+    bits = 1 + bytesize + (0 if parity == 'N' else 1) + stopbits
+    return bits / baudrate
+
+
+def silent_interval(baudrate, bytesize=8, parity='N', stopbits=1):
+    # The spec fixes t3.5 at 1.75 ms above 19200 baud
+    if baudrate > 19200:
+        return 0.00175
+    return 3.5 * char_time(baudrate, bytesize, parity, stopbits)
+
+
+def request_bytes(request):
+    if request.fc in (1, 2):
+        response = 5 + (request.count + 7) // 8
+    else:
+        response = 5 + 2 * request.count
+    return 8, response
+
+
+def estimate_bus_time(plan, baudrate, bytesize=8, parity='N', stopbits=1, turnaround=DEFAULT_TURNAROUND):
+    t_char = char_time(baudrate, bytesize, parity, stopbits)
+    t_silent = silent_interval(baudrate, bytesize, parity, stopbits)
+    total = 0.0
+    for request in plan:
+        sent, received = request_bytes(request)
+        total += (sent + received) * t_char + 2 * t_silent + turnaround
+    return total
+
+
+def describe_plan(plan, baudrate, bytesize=8, parity='N', stopbits=1, turnaround=DEFAULT_TURNAROUND):
+    return {
+        "frames": len(plan),
+        "values": sum(request.count for request in plan),
+        "bus_time": estimate_bus_time(plan, baudrate, bytesize, parity, stopbits, turnaround),
+    }
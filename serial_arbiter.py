@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+import logging
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Lower number is served first. Forwarded TCP writes always jump ahead of
+# background polling, so a write waits for at most one transaction in flight.
+PRIORITY_WRITE = 0
+PRIORITY_POLL = 10
+_PRIORITY_STOP = sys.maxsize
+
+
+# --- Bus Statistics ---
+# Queue depth and per-priority wait time, shared by the threaded and asyncio arbiters.
+class _ArbiterStats:
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self.max_queue_depth = 0
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            per_priority = {
+                priority: {
+                    "count": s["count"],
+                    "avg_wait": s["wait_total"] / s["count"] if s["count"] else 0.0,
+                    "max_wait": s["wait_max"],
+                    "last_wait": s["wait_last"],
+                }
+                for priority, s in self._stats.items()
+            }
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue_depth": self.max_queue_depth,
+            "priorities": per_priority,
+        }
+
+    def _record_depth(self):
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+
+    def _record_wait(self, priority, wait):
+        with self._stats_lock:
+            s = self._stats.setdefault(priority, {"count": 0, "wait_total": 0.0, "wait_max": 0.0, "wait_last": 0.0})
+            s["count"] += 1
+            s["wait_total"] += wait
+            s["wait_last"] = wait
+            if wait > s["wait_max"]:
+                s["wait_max"] = wait
+
+
+# --- Serial Bus Arbiter ---
+# Owns one ModbusSerialClient. Every thread that wants to talk on the RS-485 line
+# submits a transaction here instead of calling the client directly, so frames
+# can never interleave on the wire.
+class SerialBusArbiter(_ArbiterStats):
+    def __init__(self, client, name=None):
+        super().__init__()
+        self.client = client
+        self.name = name or str(client.comm_params.host)
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"bus-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        if self._thread is not None:
+            self._queue.put((_PRIORITY_STOP, next(self._seq), None, None, None, None))
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, method, *args, priority=PRIORITY_POLL, **kwargs):
+        future = Future()
+        self._queue.put((priority, next(self._seq), time.monotonic(), future, method, (args, kwargs)))
+        self._record_depth()
+        return future
+
+    def call(self, method, *args, priority=PRIORITY_POLL, **kwargs):
+        return self.submit(method, *args, priority=priority, **kwargs).result()
+
+    def _run(self):
+        while True:
+            priority, _, queued_at, future, method, call_args = self._queue.get()
+            if priority == _PRIORITY_STOP:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._record_wait(priority, time.monotonic() - queued_at)
+            args, kwargs = call_args
+            try:
+                future.set_result(getattr(self.client, method)(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+        logging.debug(f"Serial bus arbiter for {self.name} stopped")
+
+
+# --- Asyncio Serial Bus Arbiter ---
+# Same contract as SerialBusArbiter for an AsyncModbusSerialClient: one task owns
+# the line and drains a priority queue, callers await the returned future.
+class AsyncSerialBusArbiter(_ArbiterStats):
+    def __init__(self, client, name=None):
+        super().__init__()
+        self.client = client
+        self.name = name or str(client.comm_params.host)
+        self._queue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"bus-{self.name}")
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._queue.put_nowait((_PRIORITY_STOP, next(self._seq), None, None, None, None))
+            await self._task
+            self._task = None
+
+    def submit(self, method, *args, priority=PRIORITY_POLL, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._seq), time.monotonic(), future, method, (args, kwargs)))
+        self._record_depth()
+        return future
+
+    async def call(self, method, *args, priority=PRIORITY_POLL, **kwargs):
+        return await self.submit(method, *args, priority=priority, **kwargs)
+
+    async def _run(self):
+        while True:
+            priority, _, queued_at, future, method, call_args = await self._queue.get()
+            if priority == _PRIORITY_STOP:
+                break
+            # The requester went away (e.g. TCP client disconnected) before its turn
+            if future.cancelled():
+                continue
+            self._record_wait(priority, time.monotonic() - queued_at)
+            args, kwargs = call_args
+            try:
+                result = await getattr(self.client, method)(*args, **kwargs)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+        logging.debug(f"Serial bus arbiter for {self.name} stopped")
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import poll_groups
+from poll_groups import PollJob, PollScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Stop(Exception):
+    pass
+
+
+class Metrics:
+    def __init__(self):
+        self.polls = []
+
+    def observe_poll(self, port, job):
+        self.polls.append((port, job.name, job.last_duration))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(poll_groups, "time", clock)
+    return clock
+
+
+def job(name, period=1.0, priority=0, deadline=None, bus_time=0.0):
+    return PollJob(name, 1, None, [], period, priority, deadline, bus_time)
+
+
+# Runs the scheduler on the fake clock until `polls` cycles are done; each
+# cycle of a job takes its next duration from `durations`
+def run(scheduler, clock, durations, polls):
+    order = []
+
+    async def poll(job):
+        if len(order) == polls:
+            raise Stop
+        order.append(job.name)
+        clock.now += durations[job.name].pop(0) if len(durations[job.name]) > 1 else durations[job.name][0]
+
+    async def sleep(delay):
+        clock.now += delay
+
+    scheduler.poll = poll
+    scheduler._sleep = sleep
+    with pytest.raises(Stop):
+        asyncio.run(scheduler.run())
+    return order
+
+
+def test_due_jobs_go_by_priority_then_earliest_deadline(clock):
+    scheduler = PollScheduler("COM5", None)
+    urgent = job("urgent", priority=0, deadline=5.0)
+    tight = job("tight", priority=0, deadline=2.0)
+    background = job("background", priority=1, deadline=0.5)
+    later = job("later", priority=0, deadline=0.1)
+    for item in (urgent, tight, background, later):
+        scheduler.add(item)
+    later.next_release = 1.0
+    assert scheduler._next_job(0.0) is tight
+    # An earlier release makes an earlier absolute deadline
+    tight.next_release = 3.5
+    assert scheduler._next_job(0.0) is urgent
+    urgent.next_release = 3.5
+    assert scheduler._next_job(0.0) is background
+    assert scheduler._next_job(3.5) is later
+    background.next_release = later.next_release = 4.0
+    assert scheduler._next_job(3.0) is None
+
+
+def test_overruns_and_skipped_cycles_are_counted(clock):
+    scheduler = PollScheduler("COM5", None)
+    scheduler.metrics = Metrics()
+    fast = job("fast", priority=0, bus_time=0.1)
+    slow = job("slow", priority=1)
+    scheduler.add(fast)
+    scheduler.add(slow)
+    # slow's first cycle holds the line for 2.5 s: fast is late once, slow misses a cycle
+    order = run(scheduler, clock, {"fast": [0.1], "slow": [2.5, 0.1]}, polls=7)
+    assert order == ["fast", "slow", "fast", "fast", "slow", "fast", "slow"]
+    assert (fast.runs, fast.overruns, fast.skipped) == (4, 1, 0)
+    assert (slow.runs, slow.overruns, slow.skipped) == (3, 1, 1)
+    assert slow.max_duration == pytest.approx(2.5)
+    assert fast.last_lateness < 0 < slow.stats()["max_duration"]
+    assert [name for _, name, _ in scheduler.metrics.polls] == order
+
+
+def test_idle_scheduler_waits_for_the_next_release(clock):
+    scheduler = PollScheduler("COM5", None)
+    scheduler.add(job("minute", period=60.0, bus_time=0.5))
+    order = run(scheduler, clock, {"minute": [0.5]}, polls=3)
+    assert order == ["minute"] * 3
+    # Stopped when the fourth cycle was released
+    assert clock.now == pytest.approx(180.0)
+    assert scheduler.jobs[0].overruns == scheduler.jobs[0].skipped == 0
@@ -0,0 +1,40 @@
+import pytest
+
+from read_planner import ReadRequest, plan_reads
+
+
+def test_gap_up_to_max_gap_is_read_through():
+    assert plan_reads({3: [0, 1, 12]}) == [ReadRequest(3, 0, 13)]
+    assert plan_reads({3: [0, 1, 13]}) == [ReadRequest(3, 0, 2), ReadRequest(3, 13, 1)]
+
+
+def test_max_gap_override_per_function_code():
+    assert plan_reads({3: [0, 5]}, max_gap=0) == [ReadRequest(3, 0, 1), ReadRequest(3, 5, 1)]
+    assert plan_reads({3: [0, 5], 1: [0, 5]}, max_gap={1: 0}) == [
+        ReadRequest(1, 0, 1), ReadRequest(1, 5, 1), ReadRequest(3, 0, 6)]
+
+
+def test_duplicates_and_order_do_not_matter():
+    assert plan_reads({4: [3, 1, 2, 1]}) == [ReadRequest(4, 1, 3)]
+
+
+def test_register_reads_stay_within_protocol_limit():
+    plan = plan_reads({3: range(300)})
+    assert plan == [ReadRequest(3, 0, 125), ReadRequest(3, 125, 125), ReadRequest(3, 250, 50)]
+
+
+def test_bit_reads_stay_within_protocol_limit():
+    plan = plan_reads({1: range(4500)})
+    assert [request.count for request in plan] == [2000, 2000, 500]
+
+
+def test_gap_merge_does_not_exceed_limit():
+    # Every gap is read through, but 0-130 would be 131 registers
+    plan = plan_reads({3: range(0, 131, 10)})
+    assert plan == [ReadRequest(3, 0, 121), ReadRequest(3, 130, 1)]
+
+
+@pytest.mark.parametrize("addresses", [{5: [0]}, {3: [-1]}, {3: [0x10000]}])
+def test_invalid_input(addresses):
+    with pytest.raises(ValueError):
+        plan_reads(addresses)